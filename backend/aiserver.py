@@ -1,113 +1,421 @@
 import os
+import re
+import hashlib
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import orjson
+from cachetools import TTLCache
+from numba import njit
+from rank_bm25 import BM25Okapi
+
+from matcher_base import (
+    CACHE_LOCK, BaseCompetitorMatcher, OrjsonProvider, fast_json, parse_match_request, require_env
+)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # 强力 CORS 配置
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
+# 文本向量按 SHA-256 缓存 1 天
+EMBED_CACHE = TTLCache(maxsize=4096, ttl=86400)
+# 卖家自己的描述很少变化，单独缓存 7 天，不会被大量竞品文本挤出去
+MY_VEC_CACHE = TTLCache(maxsize=256, ttl=7 * 86400)
+
+# BM25 预筛用的简单分词：小写后按字母数字切分，德语变音字母也算在内
+TOKEN_RE = re.compile(r"\w+")
+
+# 可选：本地 ONNX Runtime 编码，省掉 HF 的网络往返和冷启动。
+# 先导出并量化一次模型：python export_onnx.py onnx/
+# 再设置 ONNX_MODEL_DIR=onnx/；未设置或加载失败时继续使用 HF API。
+# 目录里还需要 sentence-transformers 的 modules.json 和 Pooling/Dense 子目录，
+# 否则无法确认 pooling 之后的结构，不会启用本地编码。
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR")
+# 默认优先用 int8 量化版本，没有时退回 FP32 导出
+ONNX_MODEL_FILE = os.environ.get("ONNX_MODEL_FILE") or (
+    "model_quantized.onnx"
+    if ONNX_MODEL_DIR and os.path.exists(os.path.join(ONNX_MODEL_DIR, "model_quantized.onnx"))
+    else "model.onnx"
+)
+ONNX_BATCH_SIZE = 32
+# ORT 计算线程数：多个 gunicorn worker 平分所有核，否则 N 个进程各开 N 个线程互相抢核；
+# 单进程运行 (python aiserver.py，没有 WEB_CONCURRENCY) 时用满所有核
+ORT_THREADS = int(os.environ.get("ORT_THREADS") or max(
+    1, (os.cpu_count() or 1) // int(os.environ.get("WEB_CONCURRENCY", 1))
+))
+
+
+def load_sentence_head(model_dir):
+    """
+    按 sentence-transformers 的 modules.json 读取 pooling 之后的 Dense 层，返回 [(W, b, 是否 tanh)]。
+    ONNX 只导出了 Transformer 本体，distiluse 这类模型还要再过一层 768→512 的 Dense+Tanh，
+    漏掉它得到的向量和 HF 接口返回的不在同一个空间。不认识的结构直接报错，不静默算错。
+    """
+    from safetensors.numpy import load_file
+
+    def read_config(path):
+        with open(os.path.join(path, 'config.json'), 'rb') as f:
+            return orjson.loads(f.read())
+
+    with open(os.path.join(model_dir, 'modules.json'), 'rb') as f:
+        modules = orjson.loads(f.read())
+
+    layers = []
+    pooled = False
+    for module in modules:
+        kind = module['type'].rsplit('.', 1)[-1]
+        path = os.path.join(model_dir, module.get('path', ''))
+        if kind == 'Transformer':
+            continue
+        if kind == 'Normalize':
+            continue  # get_embeddings 里统一做 L2 归一化
+        if kind == 'Pooling':
+            modes = [k for k, v in read_config(path).items() if k.startswith('pooling_mode') and v]
+            if modes != ['pooling_mode_mean_tokens']:
+                raise ValueError(f"unsupported pooling {modes}, only mean pooling is implemented")
+            pooled = True
+        elif kind == 'Dense' and pooled:
+            act = read_config(path).get('activation_function', '').rsplit('.', 1)[-1]
+            if act not in ('Tanh', 'Identity'):
+                raise ValueError(f"unsupported Dense activation {act}")
+            weights = load_file(os.path.join(path, 'model.safetensors'))
+            bias = weights.get('linear.bias')
+            layers.append((
+                weights['linear.weight'].astype(np.float32),
+                None if bias is None else bias.astype(np.float32),
+                act == 'Tanh',
+            ))
+        else:
+            raise ValueError(f"unsupported sentence-transformers module {module['type']}")
+
+    if not pooled:
+        raise ValueError("modules.json has no Pooling module")
+    return layers
+
+
+def load_onnx_encoder():
+    if not ONNX_MODEL_DIR:
+        return None, None, []
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = ORT_THREADS
+
+        head = load_sentence_head(ONNX_MODEL_DIR)
+        tokenizer = AutoTokenizer.from_pretrained(ONNX_MODEL_DIR)
+        model = ORTModelForFeatureExtraction.from_pretrained(
+            ONNX_MODEL_DIR, file_name=ONNX_MODEL_FILE, provider='CPUExecutionProvider', session_options=options
+        )
+        print(f"✅ Local ONNX encoder loaded from {ONNX_MODEL_DIR}/{ONNX_MODEL_FILE} (+{len(head)} Dense)")
+        return tokenizer, model, head
+    except Exception as e:
+        print(f"❌ ONNX Load Error: {e}, falling back to HF API")
+        return None, None, []
 
-class AmazonCompetitorMatcher:
-    def __init__(self, rainforest_api_key, hf_token):
-        self.rainforest_api_key = rainforest_api_key
-        self.hf_token = hf_token
-        self.rainforest_url = "https://api.rainforestapi.com/request"
 
-        self.model_id = "sentence-transformers/distiluse-base-multilingual-cased-v1"
+ONNX_TOKENIZER, ONNX_MODEL, ONNX_HEAD = load_onnx_encoder()
+
+
+def run_native(fn, *args, **kwargs):
+    """
+    执行不会让出的 C 调用 (ONNX Runtime 推理)。gevent worker 下线程池里的"线程"其实是协程，
+    直接调用会卡住同一进程里的详情请求和其他请求；这时交给 gevent hub 的真实 OS 线程执行。
+    """
+    try:
+        from gevent import get_hub, monkey
+        if monkey.is_module_patched('threading'):
+            return get_hub().threadpool.apply(fn, args, kwargs)
+    except ImportError:
+        pass
+    return fn(*args, **kwargs)
+
+EMBED_MODEL_ID = os.environ.get("EMBED_MODEL_ID", "sentence-transformers/distiluse-base-multilingual-cased-v1")
+# 没有分词器可用时的字符截断长度
+MAX_TEXT_CHARS = int(os.environ.get("MAX_TEXT_CHARS", 800))
+# 模型只看前 128 个 token，多余的字符发过去也会被服务端截掉
+MAX_SEQ_TOKENS = 128
+
+
+def load_clip_tokenizer():
+    # 本地 ONNX 编码不需要预先截断 (见 _clip)
+    if ONNX_MODEL is not None:
+        return None
+    try:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(EMBED_MODEL_ID, use_fast=True)
+    except Exception as e:
+        print(f"⚠️ Tokenizer Load Error: {e}, truncating by characters")
+        return None
+
+
+CLIP_TOKENIZER = load_clip_tokenizer()
+
+
+@njit(cache=True, fastmath=True)
+def top_score(M, q):
+    """
+    M: (N, D) 已归一化的 float32 候选向量，q: (D,) 我的向量；返回 (最佳下标, 全部分数)。
+    候选只有几个，直接写循环比调用 BLAS 的分派开销还小。
+    """
+    n, d = M.shape
+    scores = np.empty(n, np.float32)
+    best = 0
+    for i in range(n):
+        s = np.float32(0.0)
+        for j in range(d):
+            s += M[i, j] * q[j]
+        scores[i] = s
+        if s > scores[best]:
+            best = i
+    return best, scores
+
+
+# 启动时先编译一次，第一个请求不用等 JIT
+top_score(np.zeros((1, 1), np.float32), np.zeros(1, np.float32))
+
+
+class CandidateTable:
+    """
+    候选商品的列式存储：数值字段和向量放进连续的 numpy 数组，相似度和最佳下标由 top_score 一次算出，
+    只在返回前才拼回前端需要的 dict。
+    """
+
+    def __init__(self, candidates, embeddings):
+        self.rows = candidates
+        # 价格保留 float64，避免 19.99 这类金额在 JSON 里变成 19.9899997
+        self.prices = np.array([c['price'] or 0.0 for c in candidates], dtype=np.float64)
+        self.sales = np.array([c['sales'] or 0 for c in candidates], dtype=np.int32)
+        # (N, D)，已 L2 归一化
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.sims = np.zeros(len(candidates), dtype=np.float32)
+
+    def score(self, my_vec):
+        """计算所有候选与 my_vec 的余弦相似度，返回最佳候选的下标"""
+        best, self.sims = top_score(self.embeddings, np.ascontiguousarray(my_vec, dtype=np.float32))
+        return int(best)
+
+    def to_dicts(self):
+        return [
+            dict(
+                row,
+                price=float(self.prices[i]),
+                sales=int(self.sales[i]),
+                similarity=float(self.sims[i]),
+                features=row['desc_text'][:100] + "...",
+            )
+            for i, row in enumerate(self.rows)
+        ]
+
+
+class AmazonCompetitorMatcher(BaseCompetitorMatcher):
+    # BM25 预筛后保留的候选数
+    PREFILTER_TOP_K = 2
+
+    def __init__(self, rainforest_api_key, hf_token, model_id=None, max_text_chars=MAX_TEXT_CHARS):
+        super().__init__(rainforest_api_key)
+        self.hf_token = hf_token
+        self.model_id = model_id or EMBED_MODEL_ID
+        self.max_text_chars = max_text_chars
 
         # ✅ 终极修复：
         # 1. 使用 router.huggingface.co 新域名 (解决 410 错误)
         # 2. 显式指定 /pipeline/feature-extraction/ 路径 (解决 'sentences' 参数缺失错误)
         self.hf_api_url = f"https://router.huggingface.co/hf-inference/pipeline/feature-extraction/{self.model_id}"
 
-    def _make_rainforest_request(self, params):
-        params['api_key'] = self.rainforest_api_key
-        if 'amazon_domain' not in params:
-            params['amazon_domain'] = 'amazon.de'
-        try:
-            print(f"📡 Calling Rainforest: {params.get('type')}")
-            response = requests.get(self.rainforest_url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"❌ Rainforest Error: {e}")
-            return None
-
-    def get_product_details(self, asin):
-        params = {'type': 'product', 'asin': asin}
-        data = self._make_rainforest_request(params)
-        if not data or 'product' not in data:
-            return ""
-        p = data['product']
-        return f"{p.get('title', '')}. " + " ".join(p.get('feature_bullets', [])) + str(p.get('description', ''))
+    def _clip(self, text):
+        """按 token 截断到模型窗口 (预留 [CLS]/[SEP])，没有分词器时退回字符截断"""
+        if ONNX_MODEL is not None:
+            # 只有发给 HF 的文本需要预先截断；本地分词器编码时自己按 MAX_SEQ_TOKENS 截断，
+            # 这里再分词、解码一遍只会多做一次分词，还让模型看到解码后的文本
+            return text
+        if CLIP_TOKENIZER is None:
+            return text[:self.max_text_chars]
+        ids = CLIP_TOKENIZER.encode(text, add_special_tokens=False, truncation=True, max_length=MAX_SEQ_TOKENS - 2)
+        return CLIP_TOKENIZER.decode(ids)
 
     def get_embeddings_from_hf(self, texts):
-        headers = {"Authorization": f"Bearer {self.hf_token}"}
-        payload = {
+        headers = {"Authorization": f"Bearer {self.hf_token}", "Content-Type": "application/json"}
+        # 请求体和响应里的大量浮点数都交给 orjson，比标准库 json 快得多
+        body = orjson.dumps({
             "inputs": texts,
             "options": {"wait_for_model": True}
-        }
+        })
         try:
             print(f"🧠 Calling HuggingFace Router (Feature Extraction) for {len(texts)} texts...")
             # 打印 URL 以便调试，确保它是 feature-extraction
             print(f"   Endpoint: {self.hf_api_url}")
 
-            response = requests.post(self.hf_api_url, headers=headers, json=payload, timeout=30)
+            response = self.session.post(self.hf_api_url, headers=headers, data=body, timeout=self.TIMEOUT)
 
             if response.status_code != 200:
                 print(f"❌ HF API Error {response.status_code}: {response.text}")
                 return None
 
-            return response.json()
+            return orjson.loads(response.content)
 
         except Exception as e:
             print(f"❌ HuggingFace Network Error: {e}")
             return None
 
+    def get_embeddings_from_onnx(self, texts):
+        print(f"🧠 Running local ONNX encoder for {len(texts)} texts...")
+        # 只分词一次，按 token 数排序后分小批，每批只 pad 到批内最长，最后再按原顺序还原
+        encoded = ONNX_TOKENIZER(texts, truncation=True, max_length=MAX_SEQ_TOKENS)
+        order = np.argsort([len(ids) for ids in encoded['input_ids']])
+        vecs = [None] * len(texts)
+
+        for start in range(0, len(texts), ONNX_BATCH_SIZE):
+            idx = order[start:start + ONNX_BATCH_SIZE]
+            batch = {k: [v[i] for i in idx] for k, v in encoded.items()}
+            inputs = ONNX_TOKENIZER.pad(batch, return_tensors='np')
+            hidden = run_native(ONNX_MODEL, **inputs).last_hidden_state
+
+            # 按 attention mask 做 mean pooling，忽略 padding 位置
+            mask = inputs['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            # 再接上 sentence-transformers 的 Dense 层，和 HF 接口的输出保持同一个向量空间
+            for W, b, tanh in ONNX_HEAD:
+                pooled = pooled @ W.T
+                if b is not None:
+                    pooled = pooled + b
+                if tanh:
+                    pooled = np.tanh(pooled)
+            for i, vec in zip(idx, pooled):
+                vecs[i] = vec
+
+        return np.array(vecs, dtype=np.float32)
+
+    def get_embeddings(self, texts):
+        """
+        一次请求批量编码所有文本，返回 L2 归一化的 (N, D) 矩阵；失败时返回原始响应供上层兜底。
+        已缓存的文本不再重复编码，只批量编码未命中的部分。
+        """
+        keys = [hashlib.sha256(t.encode()).hexdigest() for t in texts]
+        # 重复文本 (例如我的描述恰好等于某个竞品标题) 只编码一次，最后按 inverse 散回原位置
+        unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        unique_keys = unique_keys.tolist()
+
+        with CACHE_LOCK:
+            found = {k: EMBED_CACHE.get(k) for k in unique_keys}
+        misses = [(k, texts[i]) for k, i in zip(unique_keys, first) if found[k] is None]
+
+        if misses:
+            miss_texts = [t for _, t in misses]
+            if ONNX_MODEL is not None:
+                vecs = self.get_embeddings_from_onnx(miss_texts)
+            else:
+                embeddings = self.get_embeddings_from_hf(miss_texts)
+                if not embeddings or not isinstance(embeddings, list):
+                    return embeddings
+
+                # 处理 Hugging Face 返回的维度问题 (有时是 [N, 384], 有时是 [1, N, 384])
+                # 直接解析成 float32，相似度不需要 float64 的精度，缓存和矩阵乘法都省一半带宽
+                try:
+                    vecs = np.array(embeddings, dtype=np.float32)
+                    if vecs.ndim == 3:
+                        vecs = vecs[0]  # 降维
+                    if vecs.ndim != 2 or len(vecs) != len(miss_texts):
+                        raise ValueError(f"shape {vecs.shape} for {len(miss_texts)} texts")
+                except ValueError as e:
+                    # 参差不齐或数量不对的响应交给上层兜底，不让整个请求 500
+                    print(f"❌ Malformed HF embeddings: {e}")
+                    return None
+
+            # 编码后立即 L2 归一化，缓存里存的就是单位向量，余弦相似度只剩点积
+            vecs = vecs / (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12)
+
+            with CACHE_LOCK:
+                for (k, _), vec in zip(misses, vecs):
+                    found[k] = vec
+                    EMBED_CACHE[k] = vec
+
+        return np.array([found[k] for k in unique_keys], dtype=np.float32)[inverse]
+
+    def _lexical_prefilter(self, my_desc, texts):
+        """
+        用 BM25 按搜索文本给候选打分，只保留前 PREFILTER_TOP_K 个的下标 (保持原顺序)。
+        所有候选都和我的描述没有词重叠时全部保留，避免漏掉跨语言的匹配。
+        """
+        if len(texts) <= self.PREFILTER_TOP_K:
+            return list(range(len(texts)))
+        try:
+            bm25 = BM25Okapi([TOKEN_RE.findall(t.lower()) for t in texts])
+            scores = bm25.get_scores(TOKEN_RE.findall(my_desc.lower()))
+        except Exception as e:
+            print(f"⚠️ BM25 Error: {e}, keeping all candidates")
+            return list(range(len(texts)))
+
+        if scores.max() <= 0:
+            return list(range(len(texts)))
+        return sorted(np.argsort(-scores)[:self.PREFILTER_TOP_K].tolist())
+
     def search_and_match(self, my_desc, keyword):
         # 1. 搜索
-        params = {'type': 'search', 'search_term': keyword, 'sort_by': 'featured'}
-        data = self._make_rainforest_request(params)
-
-        candidates = []
-        if data and 'search_results' in data:
-            # 限制前 3 个
-            for item in data['search_results'][:3]:
-                candidates.append({
-                    'id': item.get('asin'),
-                    'title': item.get('title'),
-                    'price': item.get('price', {}).get('value', 0.0),
-                    'currency': item.get('price', {}).get('currency', 'EUR'),
-                    'link': item.get('link'),
-                    'sales': item.get('ratings_total', 0),
-                    'desc_text': ''
-                })
-
+        candidates, search_texts = self.get_candidates(keyword)
         if not candidates:
             return None, []
 
+        # 词法预筛：明显不相关的候选不再请求详情，也不再编码
+        keep = self._lexical_prefilter(my_desc, search_texts)
+        candidates = [candidates[i] for i in keep]
+        search_texts = [search_texts[i] for i in keep]
+
+        my_key = hashlib.sha256(my_desc.encode()).hexdigest()
+        with CACHE_LOCK:
+            my_vec = MY_VEC_CACHE.get(my_key)
+
         # 2. 详情
-        all_texts = [my_desc]
+        # 我的描述也按 token 截断，超出模型窗口的部分不必发出去
+        my_text = self._clip(my_desc)
+        all_texts = [my_text]
         valid_candidates = []
 
-        print("⏳ Fetching details...")
-        for item in candidates:
-            dt = self.get_product_details(item['id'])
+        # 我的描述和不需要详情的候选都不依赖详情请求，可以提前编码；
+        # 和详情请求同时执行，结果进 EMBED_CACHE，下面批量编码时直接命中
+        # 这些候选的最终文本就是搜索文本，只截断一次，下面直接复用
+        clipped = {i: self._clip(t) for i, t in enumerate(search_texts) if t and not self.needs_details(t)}
+        early_texts = list(clipped.values())
+        if my_vec is None:
+            early_texts.insert(0, my_text)
+        early = {}
+
+        def encode_early():
+            early['vecs'] = self.get_embeddings(early_texts)
+
+        detail_texts = self.fetch_detail_texts(
+            candidates, search_texts, background=encode_early if early_texts else None
+        )
+        # 提前编码失败 (异常或 HF 出错) 时，同样的文本不再发第二次，直接走下面的兜底
+        early_failed = bool(early_texts) and not isinstance(early.get('vecs'), np.ndarray)
+
+        for i, (item, dt) in enumerate(zip(candidates, detail_texts)):
             if dt:
-                item['desc_text'] = dt
-                all_texts.append(dt[:800])
+                item['desc_text'] = dt[:200]  # 前端只展示一小段，全文只用于计算相似度
+                all_texts.append(clipped[i] if i in clipped else self._clip(dt))
                 valid_candidates.append(item)
 
         if not valid_candidates: return None, []
 
-        # 3. 向量
-        embeddings = self.get_embeddings_from_hf(all_texts)
-
-        if not embeddings or isinstance(embeddings, dict):
+        # 3. 向量 (我的描述 + 所有竞品，一次批量编码；我的向量已缓存时只编码竞品)
+        if early_failed:
+            embeddings = None
+        elif my_vec is not None:
+            embeddings = self.get_embeddings(all_texts[1:])
+            if isinstance(embeddings, np.ndarray) and len(embeddings):
+                embeddings = np.vstack([my_vec, embeddings])
+        else:
+            embeddings = self.get_embeddings(all_texts)
+            if isinstance(embeddings, np.ndarray) and len(embeddings):
+                with CACHE_LOCK:
+                    # 存副本：切片是视图，会让整个请求的矩阵跟着缓存活 7 天
+                    MY_VEC_CACHE[my_key] = embeddings[0].copy()
+
+        if embeddings is None or isinstance(embeddings, dict) or len(embeddings) == 0:
             print(f"Embeddings failed. Response: {embeddings}")
             # 兜底模拟数据，防止前端白屏
             if valid_candidates:
@@ -118,38 +426,36 @@ class AmazonCompetitorMatcher:
                 return best, valid_candidates
             return None, []
 
-        if not isinstance(embeddings, list):
+        if not isinstance(embeddings, np.ndarray):
             print(f"Unexpected format: {type(embeddings)}")
             return None, []
 
         # 4. 计算
         try:
-            # 处理 Hugging Face 返回的维度问题 (有时是 [N, 384], 有时是 [1, N, 384])
-            embeddings_arr = np.array(embeddings)
-            if embeddings_arr.ndim == 3:
-                embeddings_arr = embeddings_arr[0]  # 降维
-
-            my_vector = embeddings_arr[0].reshape(1, -1)
-
-            best_match = None
-            highest_score = -1
+            # 向量在 get_embeddings 里已归一化，余弦相似度就是一次矩阵乘法
+            # 第0个是我的文本，后面是竞品
+            M = np.asarray(embeddings, dtype=np.float32)
+            table = CandidateTable(valid_candidates, M[1:])
+            best = table.score(M[0])
+
+            results = table.to_dicts()
+            return results[best], results
+        except Exception as e:
+            print(f"Math Error: {e}")
+            return None, []
 
-            for i, item in enumerate(valid_candidates):
-                # i+1 因为第0个是我的文本
-                item_vector = embeddings_arr[i + 1].reshape(1, -1)
 
-                score = float(cosine_similarity(my_vector, item_vector)[0][0])
-                item['similarity'] = score
-                item['features'] = item['desc_text'][:100] + "..."
+# 整个进程共用一个 matcher：Session 连接池 (keep-alive) 和缓存跨请求复用
+def build_matcher():
+    """启动时检查环境变量并构造 matcher，缺失时立即在日志里报错"""
+    # 本地 ONNX 编码时不调用 HF，不需要 HF_TOKEN
+    required = ("RAINFOREST_API_KEY",) if ONNX_MODEL is not None else ("RAINFOREST_API_KEY", "HF_TOKEN")
+    if require_env(*required) is None:
+        return None
+    return AmazonCompetitorMatcher(os.environ["RAINFOREST_API_KEY"], os.environ.get("HF_TOKEN"))
 
-                if score > highest_score:
-                    highest_score = score
-                    best_match = item
 
-            return best_match, valid_candidates
-        except Exception as e:
-            print(f"Math Error: {e}")
-            return None, []
+MATCHER = build_matcher()
 
 
 # --- Route ---
@@ -164,26 +470,20 @@ def find_competitor():
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'}), 200
 
-    data = request.json
-    keyword = data.get('keyword', '')
-    description = data.get('description', '')
-
-    r_key = os.environ.get("RAINFOREST_API_KEY")
-    h_token = os.environ.get("HF_TOKEN")
+    keyword, description, error = parse_match_request()
+    if error is not None:
+        return error
 
-    if not r_key or not h_token:
+    if MATCHER is None:
         print("❌ 错误: 环境变量缺失")
-        response = jsonify({"error": "Missing Env Vars"})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+        return fast_json({"error": "Missing Env Vars"}, 500)
 
     try:
-        matcher = AmazonCompetitorMatcher(r_key, h_token)
-        best, all_results = matcher.search_and_match(description, keyword)
-        return jsonify({"success": True, "best_match": best, "all_candidates": all_results})
+        best, all_results = MATCHER.search_and_match(description, keyword)
+        return fast_json({"success": True, "best_match": best, "all_candidates": all_results})
     except Exception as e:
         print(f"Server Error: {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
+        return fast_json({"success": False, "error": str(e)}, 500)
 
 
 if __name__ == '__main__':
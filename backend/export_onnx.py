@@ -0,0 +1,87 @@
+"""
+一次性导出：把向量模型导出为 ONNX 并做 int8 动态量化，供 aiserver 的本地编码使用。
+
+用法：
+    pip install optimum[onnxruntime]
+    python export_onnx.py onnx/
+    export ONNX_MODEL_DIR=onnx/
+
+目录里会同时有 model.onnx 和 model_quantized.onnx，aiserver 默认优先加载量化版本。
+sentence-transformers 的 modules.json 和 Pooling/Dense 子目录也会一起复制过去：
+ONNX 只包含 Transformer 本体，aiserver 按这些文件在 pooling 之后补上 Dense 层。
+"""
+import argparse
+import json
+import os
+import shutil
+
+from huggingface_hub import hf_hub_download, snapshot_download
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from transformers import AutoTokenizer
+
+# 与 aiserver.EMBED_MODEL_ID 保持一致
+DEFAULT_MODEL_ID = os.environ.get("EMBED_MODEL_ID", "sentence-transformers/distiluse-base-multilingual-cased-v1")
+
+QUANTIZATION_CONFIGS = {
+    'avx2': AutoQuantizationConfig.avx2,
+    'avx512': AutoQuantizationConfig.avx512,
+    'avx512_vnni': AutoQuantizationConfig.avx512_vnni,
+    'arm64': AutoQuantizationConfig.arm64,
+}
+
+
+def copy_sentence_modules(model_id, output_dir):
+    """复制 modules.json 和 Transformer 之外的模块目录；Dense 权重统一存成 safetensors"""
+    if os.path.isdir(model_id):
+        src = model_id
+    else:
+        modules_path = hf_hub_download(model_id, 'modules.json')
+        with open(modules_path, encoding='utf-8') as f:
+            paths = [m['path'] for m in json.load(f) if m.get('path')]
+        src = snapshot_download(model_id, allow_patterns=['modules.json'] + [f"{p}/*" for p in paths])
+
+    with open(os.path.join(src, 'modules.json'), encoding='utf-8') as f:
+        modules = json.load(f)
+    shutil.copy(os.path.join(src, 'modules.json'), output_dir)
+
+    for m in modules:
+        if not m.get('path'):
+            continue
+        dst = os.path.join(output_dir, m['path'])
+        shutil.copytree(os.path.join(src, m['path']), dst, dirs_exist_ok=True)
+        # 老模型的 Dense 只有 pytorch_model.bin，转成 aiserver 不依赖 torch 就能读的格式
+        bin_path = os.path.join(dst, 'pytorch_model.bin')
+        if not os.path.exists(os.path.join(dst, 'model.safetensors')) and os.path.exists(bin_path):
+            import torch
+            from safetensors.torch import save_file
+            save_file({k: v.contiguous() for k, v in torch.load(bin_path, map_location='cpu').items()},
+                      os.path.join(dst, 'model.safetensors'))
+        print(f"   + {m['path']} ({m['type'].rsplit('.', 1)[-1]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to int8 ONNX")
+    parser.add_argument('output_dir', nargs='?', default='onnx')
+    parser.add_argument('--model-id', default=DEFAULT_MODEL_ID)
+    parser.add_argument('--arch', choices=sorted(QUANTIZATION_CONFIGS), default='avx512_vnni',
+                        help="目标 CPU 指令集，不支持 VNNI 的机器用 avx2")
+    args = parser.parse_args()
+
+    print(f"📦 Exporting {args.model_id} to ONNX...")
+    model = ORTModelForFeatureExtraction.from_pretrained(args.model_id, export=True)
+    model.save_pretrained(args.output_dir)
+    AutoTokenizer.from_pretrained(args.model_id).save_pretrained(args.output_dir)
+    copy_sentence_modules(args.model_id, args.output_dir)
+
+    # 动态量化：权重 int8，激活在运行时量化，不需要校准数据
+    print(f"⚙️ Quantizing to int8 ({args.arch})...")
+    quantizer = ORTQuantizer.from_pretrained(args.output_dir, file_name="model.onnx")
+    qconfig = QUANTIZATION_CONFIGS[args.arch](is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=args.output_dir, quantization_config=qconfig)
+
+    print(f"✅ Done. Set ONNX_MODEL_DIR={args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+# 生产部署：gunicorn -c gunicorn.conf.py wsgi:app
+# 开发时仍可直接 python server.py
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# 每个核一个进程：TF-IDF / 向量计算是 CPU 密集的，多进程绕开 GIL
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# 传给 worker 进程，aiserver 据此给 ONNX Runtime 分配线程数 (cpu_count // workers)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# 每个请求要等好几个 Rainforest / HF 的 HTTPS 调用，用 gevent 协程代替线程，
+# 阻塞的 requests 调用会让出执行权，单个进程就能同时挂起上百个请求
+worker_class = "gevent"
+worker_connections = 1000
+
+timeout = 120
@@ -0,0 +1,230 @@
+"""
+server.py (本地 TF-IDF) 和 aiserver.py (向量) 共用的部分：
+Rainforest 请求、详情/搜索缓存、并发抓取详情，以及 orjson 的 Flask JSON provider。
+两个版本只在相似度的计算方式上不同。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import ijson
+import orjson
+import requests
+from cachetools import TTLCache
+from flask import current_app, request
+from flask.json.provider import JSONProvider
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class OrjsonProvider(JSONProvider):
+    """用 orjson 做 jsonify / request.json，numpy 数值无需手动转换"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def fast_json(payload, status=200):
+    """热路径直接用 orjson 字节构造响应，跳过 jsonify 的额外处理；CORS 头仍由 flask-cors 统一添加"""
+    return current_app.response_class(
+        orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY), status=status, mimetype='application/json'
+    )
+
+
+def parse_match_request():
+    """
+    解析并校验 /api/find-competitor 的请求体。
+    返回 (keyword, description, None)；输入不合法时返回 (None, None, 400 响应)。
+    """
+    # 请求体不是 JSON 对象、字段不是字符串时返回 400，而不是抛异常变成 500
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return None, None, fast_json({"error": "JSON object required"}, 400)
+    keyword = data.get('keyword') or ''
+    description = data.get('description') or ''
+    if not isinstance(keyword, str) or not isinstance(description, str):
+        return None, None, fast_json({"error": "keyword and description must be strings"}, 400)
+
+    # 空输入直接拒绝，不浪费 Rainforest 额度和相似度计算
+    if not keyword.strip():
+        return None, None, fast_json({"error": "keyword required"}, 400)
+    if len(description.strip()) < 10:
+        return None, None, fast_json({"error": "description too short"}, 400)
+    return keyword, description, None
+
+
+def require_env(*names):
+    """启动时读取必需的环境变量，缺失时立即在日志里报错并返回 None"""
+    values = [os.environ.get(name) for name in names]
+    missing = [name for name, value in zip(names, values) if not value]
+    if missing:
+        print(f"❌ 错误: 缺少 {' / '.join(missing)}，/api/find-competitor 将返回 500")
+        return None
+    return values
+
+
+# 进程内缓存：同一站点同一 ASIN 的详情 1 小时内不再重复扣 Rainforest 额度
+PRODUCT_CACHE = TTLCache(maxsize=4096, ttl=3600)
+# 同一关键词的搜索结果几分钟内基本不变
+SEARCH_CACHE = TTLCache(maxsize=512, ttl=300)
+# TTLCache 不是线程安全的，详情是并发抓取的
+CACHE_LOCK = threading.Lock()
+
+
+class BaseCompetitorMatcher:
+    AMAZON_DOMAIN = 'amazon.de'
+    # 搜索结果里的标题 + 摘要达到这个长度就足够做相似度，不再为它请求详情
+    MIN_SEARCH_TEXT_LEN = 80
+    # 连接池大小：同一进程里的并发请求共用这些 keep-alive 连接
+    POOL_SIZE = 32
+    # 单个请求并发详情请求的上限，只占连接池的一部分，给其他并发请求留出连接
+    DETAIL_WORKERS = 8
+    # (连接, 读取) 超时分开设置：DNS / 握手卡住时快速失败，不会吃掉整个读取预算
+    TIMEOUT = (3.05, 25)
+
+    def __init__(self, rainforest_api_key):
+        self.rainforest_api_key = rainforest_api_key
+        self.rainforest_url = "https://api.rainforestapi.com/request"
+
+        # 复用连接池，详情请求并发时不必每次重新握手
+        self.session = requests.Session()
+        # 网关偶发的 502/503/504 自动重试，不必让整个请求失败
+        retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=self.POOL_SIZE, pool_maxsize=self.POOL_SIZE, max_retries=retry)
+        self.session.mount('https://', adapter)
+
+    def _make_rainforest_request(self, params, stream=False, parse=None):
+        """
+        所有 Rainforest 调用的唯一入口：api_key / 站点、超时、日志和错误处理只在这里写一次。
+        parse 接收已检查过状态码的响应并返回结果，默认用 orjson 解析整个响应体；失败时返回 None。
+        """
+        params = {**params, 'api_key': self.rainforest_api_key}
+        params.setdefault('amazon_domain', self.AMAZON_DOMAIN)
+        try:
+            print(f"📡 Calling Rainforest: {params.get('type')}")
+            with self.session.get(self.rainforest_url, params=params, stream=stream, timeout=self.TIMEOUT) as response:
+                response.raise_for_status()
+                if parse is not None:
+                    return parse(response)
+                # 搜索响应可能有几百 KB，orjson 解析比 response.json() 的标准库 json 快几倍
+                return orjson.loads(response.content)
+        except Exception as e:
+            print(f"❌ Rainforest Error: {e}")
+            return None
+
+    @staticmethod
+    def _parse_product(response):
+        """
+        流式解析详情响应，只取标题、五点描述和长描述；
+        评论、变体、图片等大字段直接跳过，不构建完整 dict。
+        """
+        response.raw.decode_content = True  # 让 urllib3 处理 gzip
+
+        p = None
+        for prefix, event, value in ijson.parse(response.raw):
+            if prefix == 'product' and event == 'start_map':
+                p = {'title': '', 'feature_bullets': [], 'description': ''}
+            elif prefix == 'product.title':
+                p['title'] = value
+            elif prefix == 'product.feature_bullets.item':
+                p['feature_bullets'].append(value)
+            elif prefix == 'product.description':
+                p['description'] = value
+        return p
+
+    def _stream_product(self, asin):
+        params = {'type': 'product', 'asin': asin}
+        return self._make_rainforest_request(params, stream=True, parse=self._parse_product)
+
+    def get_product_details(self, asin):
+        with CACHE_LOCK:
+            cached = PRODUCT_CACHE.get((asin, self.AMAZON_DOMAIN))
+        if cached is not None:
+            return cached
+
+        p = self._stream_product(asin)
+        if not p:
+            return ""
+        # 组合标题、五点描述和长描述
+        # 一次 join 拼出整段文本，跳过空字段
+        parts = []
+        if p.get('title'):
+            parts += [p['title'], '. ']
+        if p.get('feature_bullets'):
+            parts += [' '.join(p['feature_bullets']), ' ']
+        if p.get('description'):
+            parts.append(str(p['description']))
+        text = ''.join(parts).strip()
+        with CACHE_LOCK:
+            PRODUCT_CACHE[(asin, self.AMAZON_DOMAIN)] = text
+        return text
+
+    def search_products(self, keyword):
+        key = (keyword, self.AMAZON_DOMAIN)
+        with CACHE_LOCK:
+            cached = SEARCH_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+        params = {'type': 'search', 'search_term': keyword, 'sort_by': 'featured'}
+        data = self._make_rainforest_request(params)
+        if not data or 'search_results' not in data:
+            return []
+
+        # 限制前 3 个
+        results = data['search_results'][:3]
+        if results:
+            with CACHE_LOCK:
+                SEARCH_CACHE[key] = results
+        return results
+
+    def get_candidates(self, keyword):
+        """搜索并整理候选，返回 (候选列表, 与之对齐的搜索文本：标题 + 摘要)"""
+        candidates = []
+        search_texts = []
+        for item in self.search_products(keyword):
+            candidates.append({
+                'id': item.get('asin'),
+                'title': item.get('title'),
+                'price': item.get('price', {}).get('value', 0.0),
+                'currency': item.get('price', {}).get('currency', 'EUR'),
+                'link': item.get('link'),
+                'sales': item.get('ratings_total', 0),
+                'desc_text': ''
+            })
+            search_texts.append(f"{item.get('title') or ''} {item.get('snippet') or ''}".strip())
+        return candidates, search_texts
+
+    def needs_details(self, search_text):
+        return len(search_text) < self.MIN_SEARCH_TEXT_LEN
+
+    def fetch_detail_texts(self, candidates, search_texts, background=None):
+        """
+        只为搜索文本太短 (标题太笼统) 的候选请求详情，其余直接用搜索结果；返回与 candidates 对齐的文本。
+        background 是可选的无参函数，和详情请求放在同一个线程池里同时执行；
+        它的返回值不会传回，调用方自己保存结果，异常在这里记录日志。
+        """
+        detail_texts = list(search_texts)
+        short = [i for i, t in enumerate(search_texts) if self.needs_details(t)]
+        workers = len(short) + (background is not None)
+        if not workers:
+            return detail_texts
+
+        future = None
+        with ThreadPoolExecutor(max_workers=min(workers, self.DETAIL_WORKERS)) as ex:
+            if background is not None:
+                future = ex.submit(background)
+
+            if short:
+                print(f"⏳ Fetching details for {len(short)} of {len(candidates)} candidates...")
+                # 详情请求互不依赖，并发发出
+                fetched = ex.map(lambda i: self.get_product_details(candidates[i]['id']), short)
+                for i, dt in zip(short, fetched):
+                    detail_texts[i] = dt
+
+        if future is not None and future.exception() is not None:
+            print(f"❌ Background Error: {future.exception()}")
+        return detail_texts
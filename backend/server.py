@@ -1,44 +1,64 @@
 import os
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+from matcher_base import BaseCompetitorMatcher, OrjsonProvider, fast_json, parse_match_request, require_env
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 # 强力 CORS 配置
 CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
+# TF-IDF 语料：每行一条历史产品描述，启动时只拟合一次
+TFIDF_CORPUS_PATH = os.environ.get(
+    "TFIDF_CORPUS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tfidf_corpus.txt")
+)
 
-class AmazonCompetitorMatcher:
-    def __init__(self, rainforest_api_key):
-        self.rainforest_api_key = rainforest_api_key
-        self.rainforest_url = "https://api.rainforestapi.com/request"
-        # 移除 Hugging Face 相关配置，我们不再需要它了
 
-    def _make_rainforest_request(self, params):
-        params['api_key'] = self.rainforest_api_key
-        if 'amazon_domain' not in params:
-            params['amazon_domain'] = 'amazon.de'
-        try:
-            print(f"📡 Calling Rainforest: {params.get('type')}")
-            response = requests.get(self.rainforest_url, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"❌ Rainforest Error: {e}")
-            return None
-
-    def get_product_details(self, asin):
-        params = {'type': 'product', 'asin': asin}
-        data = self._make_rainforest_request(params)
-        if not data or 'product' not in data:
-            return ""
-        p = data['product']
-        # 组合标题、五点描述和长描述
-        return f"{p.get('title', '')}. " + " ".join(p.get('feature_bullets', [])) + str(p.get('description', ''))
+def seed_corpus_from_disk(path=TFIDF_CORPUS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_global_tfidf():
+    corpus = seed_corpus_from_disk()
+    if not corpus:
+        print(f"⚠️ No TF-IDF corpus at {TFIDF_CORPUS_PATH}, fitting per request")
+        return None
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), max_features=50000, sublinear_tf=True)
+    vectorizer.fit(corpus)
+    print(f"✅ TF-IDF fitted on {len(corpus)} documents")
+    return vectorizer
+
 
+GLOBAL_TFIDF = load_global_tfidf()
+
+
+def _score(texts):
+    """
+    纯计算部分：第一个文本对其余文本的 TF-IDF 余弦相似度。
+    不依赖请求上下文，CPU 密集的工作由 gunicorn 的多个 worker 进程分摊 (见 gunicorn.conf.py)。
+    """
+    if GLOBAL_TFIDF is not None:
+        # 启动时已拟合好的向量化器，这里只做 transform
+        tfidf_matrix = GLOBAL_TFIDF.transform(texts)
+    else:
+        # 没有语料时退回到按请求拟合 (自动处理德语停用词需下载nltk，这里用默认配置足够)
+        tfidf_matrix = TfidfVectorizer().fit_transform(texts)
+
+    # 计算余弦相似度：行向量归一化后就是稀疏矩阵点积
+    # 第一个向量(M[0])是我的产品
+    # 后面的向量(M[1:])是竞品
+    M = normalize(tfidf_matrix)
+    return (M[1:] @ M[0].T).toarray().ravel()
+
+
+class AmazonCompetitorMatcher(BaseCompetitorMatcher):
     def calculate_local_similarity(self, texts):
         """
         ✅ 核心替代方案：本地 TF-IDF 算法
@@ -47,18 +67,7 @@ class AmazonCompetitorMatcher:
         """
         try:
             print(f"🧠 Running Local TF-IDF for {len(texts)} texts...")
-            # 初始化向量化器 (自动处理德语停用词需下载nltk，这里用默认配置足够)
-            vectorizer = TfidfVectorizer()
-
-            # 将文本转换为 TF-IDF 矩阵
-            tfidf_matrix = vectorizer.fit_transform(texts)
-
-            # 计算余弦相似度
-            # 第一个向量(tfidf_matrix[0:1])是我的产品
-            # 后面的向量(tfidf_matrix[1:])是竞品
-            cosine_similarities = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:]).flatten()
-
-            return cosine_similarities
+            return _score(texts)
         except Exception as e:
             print(f"❌ Local Algo Error: {e}")
             # 如果只有一段文本（没有竞品），会报错，返回空
@@ -66,35 +75,18 @@ class AmazonCompetitorMatcher:
 
     def search_and_match(self, my_desc, keyword):
         # 1. 搜索
-        params = {'type': 'search', 'search_term': keyword, 'sort_by': 'featured'}
-        data = self._make_rainforest_request(params)
-
-        candidates = []
-        if data and 'search_results' in data:
-            # 限制前 3 个
-            for item in data['search_results'][:3]:
-                candidates.append({
-                    'id': item.get('asin'),
-                    'title': item.get('title'),
-                    'price': item.get('price', {}).get('value', 0.0),
-                    'currency': item.get('price', {}).get('currency', 'EUR'),
-                    'link': item.get('link'),
-                    'sales': item.get('ratings_total', 0),
-                    'desc_text': ''
-                })
-
+        candidates, search_texts = self.get_candidates(keyword)
         if not candidates:
             return None, []
 
         # 2. 获取详情
         all_texts = [my_desc]
         valid_candidates = []
+        detail_texts = self.fetch_detail_texts(candidates, search_texts)
 
-        print("⏳ Fetching details...")
-        for item in candidates:
-            dt = self.get_product_details(item['id'])
+        for item, dt in zip(candidates, detail_texts):
             if dt:
-                item['desc_text'] = dt
+                item['desc_text'] = dt[:200]  # 前端只展示一小段，全文只用于计算相似度
                 all_texts.append(dt)  # 本地算法没有长度限制，可以使用全文！
                 valid_candidates.append(item)
 
@@ -103,28 +95,32 @@ class AmazonCompetitorMatcher:
         # 3. 本地计算相似度 (取代 HF API)
         similarity_scores = self.calculate_local_similarity(all_texts)
 
-        best_match = None
-        highest_score = -1
+        # 缺失的分数按 0 处理
+        sims = np.zeros(len(valid_candidates))
+        n = min(len(sims), len(similarity_scores))
+        sims[:n] = similarity_scores[:n]
 
         # 4. 整理结果
         for i, item in enumerate(valid_candidates):
-            # 获取分数
-            if i < len(similarity_scores):
-                score = float(similarity_scores[i])
-            else:
-                score = 0.0
-
-            item['similarity'] = score
+            item['similarity'] = float(sims[i])
             # 截取一段描述用于前端展示
             item['features'] = item['desc_text'][:100] + "..."
 
-            if score > highest_score:
-                highest_score = score
-                best_match = item
-
+        best_match = valid_candidates[int(np.argmax(sims))]
         return best_match, valid_candidates
 
 
+# 整个进程共用一个 matcher：Session 连接池 (keep-alive) 和缓存跨请求复用
+def build_matcher():
+    """启动时检查环境变量并构造 matcher，缺失时立即在日志里报错"""
+    # 注意：我们不再检查 HF_TOKEN，因为不需要了
+    env = require_env("RAINFOREST_API_KEY")
+    return AmazonCompetitorMatcher(*env) if env else None
+
+
+MATCHER = build_matcher()
+
+
 # --- Route ---
 
 @app.route('/', methods=['GET'])
@@ -137,25 +133,19 @@ def find_competitor():
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'}), 200
 
-    data = request.json
-    keyword = data.get('keyword', '')
-    description = data.get('description', '')
-
-    r_key = os.environ.get("RAINFOREST_API_KEY")
-    # 注意：我们不再检查 HF_TOKEN，因为不需要了
+    keyword, description, error = parse_match_request()
+    if error is not None:
+        return error
 
-    if not r_key:
-        response = jsonify({"error": "Missing RAINFOREST_API_KEY"})
-        response.headers.add('Access-Control-Allow-Origin', '*')
-        return response, 500
+    if MATCHER is None:
+        return fast_json({"error": "Missing RAINFOREST_API_KEY"}, 500)
 
     try:
-        matcher = AmazonCompetitorMatcher(r_key)
-        best, all_results = matcher.search_and_match(description, keyword)
-        return jsonify({"success": True, "best_match": best, "all_candidates": all_results})
+        best, all_results = MATCHER.search_and_match(description, keyword)
+        return fast_json({"success": True, "best_match": best, "all_candidates": all_results})
     except Exception as e:
         print(f"Server Error: {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
+        return fast_json({"success": False, "error": str(e)}, 500)
 
 
 if __name__ == '__main__':
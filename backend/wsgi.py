@@ -0,0 +1,11 @@
+# gevent 必须在 requests / ssl 被导入之前打补丁，所以放在最前面
+from gevent import monkey
+
+monkey.patch_all()
+
+# 默认部署本地 TF-IDF 版本；要用向量版本改成 from aiserver import app
+# 注意：gevent 下线程池里的"线程"都是协程，不会让出的 C 调用会卡住整个 worker。
+# aiserver 的本地 ONNX 推理已经通过 run_native 放到 gevent 的真实线程池里执行；
+# 以后再加类似的 CPU 密集调用 (numpy 大矩阵、其他推理库) 也要这样处理，
+# 或者把 gunicorn.conf.py 的 worker_class 改回 gthread。
+from server import app  # noqa: E402,F401